@@ -1,8 +1,9 @@
 import utils
+import ws_client
 import mercadobitcoin
 from mercadobitcoin import TradeApi
-from datetime import datetime
-# from datetime import timedelta
+import logging
+import sys
 import time
 
 split = 4  # split the money in n orders
@@ -11,55 +12,53 @@ sleep = 90  # sleep n seconds
 min_balance = 100  # minimum balance to start buy orders
 start_value = 53000 # value to start buy max and below it
 
+multipliers = utils.grid_multipliers(split, -spread)  # a cada ordem spread% menor
+
+log = utils.setup_logging()
+logger = logging.getLogger(__name__)
+
 mbtcapi = mercadobitcoin.Api()
-mbtctradeapi = TradeApi(b'INSERT YOUR CLIENT ID HERE',
-                        b'INSERT YOUR CLIENT KEY HERE')
+mbtctradeapi = utils.rate_limit(TradeApi(b'INSERT YOUR CLIENT ID HERE',
+                                         b'INSERT YOUR CLIENT KEY HERE'))
+utils.keep_alive()
+
+ws_client.start()
 
 while True:
     orders = utils.list_open_orders(mbtctradeapi)
 
-    if orders.empty:
-        df_ticker = utils.ticker(mbtcapi)
-        df_balance = utils.get_account_info(mbtctradeapi)
+    if not orders:
+        ticker = ws_client.get_ticker()
+        if ticker is None:
+            ticker = utils.ticker(mbtcapi)  # websocket parado, usa a API REST
 
-        if float(df_balance.available) > min_balance:
+        balance = utils.get_account_info(mbtctradeapi)
 
-            order_size = float(df_balance.available) / split
-            last_trade = float(df_ticker['last'])
+        if balance['available'] > min_balance:
 
-            now = datetime.utcnow()
-            date_time = now.strftime("%m/%d/%Y %H:%M:%S")
-            print('############ - ', date_time, ' - ############')
+            order_size = balance['available'] / split
+            last_trade = ticker['last']
 
             if last_trade < start_value:
 
-                for x in range(split):
-                    limit_price = utils.round_down(last_trade * (1 - (((x + 1) * spread) / 100)), 5)  # a cada loop x% menor
-                    quantity = utils.round_down(order_size / limit_price, 7)
-
-                    mbtctradeapi.place_buy_order(coin_pair="BRLBTC", quantity=str(quantity), limit_price=str(limit_price))
+                prices = utils.grid_prices(last_trade, multipliers)
+                grid = [(utils.format_quantity(order_size / price), utils.format_price(price)) for price in prices]
 
-                    print('order ', x, ' => ', 'qty: ', str(quantity), ' price: ', str(limit_price))
-
-                print('')
+                utils.place_orders(mbtctradeapi, 'buy', grid)
+                utils.get_account_info.invalidate()  # saldo mudou com as novas ordens
 
+                log.flush()  # grava a saida uma vez por ciclo
                 time.sleep(sleep)
 
             else:
-                print('PRECO >', start_value, ' - aguardando', sleep, 'segundos')
+                logger.info('PRECO > %s - aguardando %s segundos', start_value, sleep)
+                log.flush()  # grava a saida uma vez por ciclo
                 time.sleep(sleep)
         else:
-            exit()
+            logger.info('SALDO < %s - encerrando', min_balance)
+            sys.exit()
 
     else:
 
-        now = datetime.utcnow()
-        # if orders['created_timestamp'].iloc[0] + timedelta(seconds=sleep) < now:
-
-        date_time = now.strftime("%m/%d/%Y %H:%M:%S")
-        print('############ - ', date_time, ' - ############')
-
-        for index, row in orders.iterrows():
-            mbtctradeapi.cancel_order(coin_pair="BRLBTC", order_id=row['order_id'])
-            print('order_id: ', str(row['order_id']), ' - CANCELED')
-        print('')
+        utils.cancel_orders(mbtctradeapi, [order['order_id'] for order in orders])
+        utils.get_account_info.invalidate()  # saldo liberado pelos cancelamentos
@@ -1,4 +1,5 @@
 import utils
+import ws_client
 import mercadobitcoin
 from mercadobitcoin import TradeApi
 from datetime import datetime
@@ -12,51 +13,54 @@ sleep = 30  # sleep n seconds
 min_balance = 0.00001  # minimum balance to start sell orders
 min_value = 0.000001 # minimum of bitcoin to sell else wait
 
+multipliers = utils.grid_multipliers(split, spread)  # a cada ordem spread% maior
+
+log = utils.setup_logging()
 
 mbtcapi = mercadobitcoin.Api()
-mbtctradeapi = TradeApi(b'INSERT YOUR CLIENT ID HERE',
-                        b'INSERT YOUR CLIENT KEY HERE')
+mbtctradeapi = utils.rate_limit(TradeApi(b'INSERT YOUR CLIENT ID HERE',
+                                         b'INSERT YOUR CLIENT KEY HERE'))
+utils.keep_alive()
+
+ws_client.start()
 
 while True:
     orders = utils.list_open_orders(mbtctradeapi)
+    wait = sleep
 
-    if orders.empty == True:
-        df_ticker = utils.ticker(mbtcapi)
-
-        if float(df_ticker['buy']) > min_value:
-
-            df_balance = utils.get_account_info(mbtctradeapi)
+    if not orders:
+        ticker = ws_client.get_ticker()
+        if ticker is None:
+            ticker = utils.ticker(mbtcapi)  # websocket parado, usa a API REST
 
-            if float(df_balance.available) > min_balance:
+        if ticker['buy'] > min_value:
 
-                order_size = float(df_balance.available) / split
-                last_trade = float(df_ticker['buy'])
+            balance = utils.get_account_info(mbtctradeapi)
 
-                now = datetime.utcnow()
-                date_time = now.strftime("%m/%d/%Y %H:%M:%S")
-                print('############ - ', date_time, ' - ############')
+            if balance['available'] > min_balance:
 
-                for x in range(split):
-                    limit_price = utils.round_down(last_trade * (1 + (((x + 1) * spread) / 100)), 5)  # a cada loop x% menor
-                    quantity = utils.round_down(order_size, 7)
+                order_size = balance['available'] / split
+                last_trade = ticker['buy']
 
-                    mbtctradeapi.place_sell_order(coin_pair="BRLBTC", quantity=str(quantity), limit_price=str(limit_price))
+                quantity = utils.format_quantity(order_size)
+                grid = [(quantity, utils.format_price(price)) for price in utils.grid_prices(last_trade, multipliers)]
 
-                    print('order ', x, ' => ', 'qty: ', str(quantity), ' price: ', str(limit_price))
-
-                print('')
-
-        time.sleep(sleep)
+                utils.place_orders(mbtctradeapi, 'sell', grid)
+                utils.get_account_info.invalidate()  # saldo mudou com as novas ordens
 
     else:
 
         now = datetime.utcnow()
-        if orders['created_timestamp'].iloc[0] + timedelta(seconds=sleep) < now:
+        expires = orders[0]['created_timestamp'] + timedelta(seconds=sleep)
+
+        if expires < now:
+            utils.cancel_orders(mbtctradeapi, [order['order_id'] for order in orders])
+            utils.get_account_info.invalidate()  # saldo liberado pelos cancelamentos
+            wait = 0
 
-            date_time = now.strftime("%m/%d/%Y %H:%M:%S")
-            print('############ - ', date_time, ' - ############')
+        else:
+            # dorme ate a ordem vencer em vez de consultar a API sem parar
+            wait = (expires - now).total_seconds()
 
-            for index, row in orders.iterrows():
-                mbtctradeapi.cancel_order(coin_pair="BRLBTC", order_id=row['order_id'])
-                print('order_id: ', str(row['order_id']), ' - CANCELED')
-            print('')
+    log.flush()  # grava a saida uma vez por ciclo
+    time.sleep(wait)
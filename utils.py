@@ -1,43 +1,220 @@
-import pandas as pd
-import json
-import math
+import collections
+import functools
+import logging
+import logging.handlers
+import sys
+import time
+from datetime import datetime, timezone
+from decimal import Decimal, ROUND_DOWN
 
-pd.options.mode.chained_assignment = None
+import mercadobitcoin
+import requests
+from requests.adapters import HTTPAdapter
 
-def ticker(mbtc):
-    ticker = json.dumps(mbtc.ticker())
-    df_ticker = pd.read_json(ticker)
-    df_ticker = df_ticker.T
-    df_ticker.reset_index(drop=True, inplace=True)
+TICKER_TTL = 2  # seconds a ticker response is reused
+BALANCE_TTL = 2  # seconds a balance response is reused
+TAPI_CALLS = 60  # maximum Trade API requests ...
+TAPI_PERIOD = 60  # ... per n seconds
+PRICE_DECIMALS = 5  # decimals accepted in limit_price
+QUANTITY_DECIMALS = 7  # decimals accepted in quantity
+HTTP_TIMEOUT = (5, 15)  # seconds to connect / to wait for a response
+
+_PRICE_QUANTUM = Decimal(1).scaleb(-PRICE_DECIMALS)
+_QUANTITY_QUANTUM = Decimal(1).scaleb(-QUANTITY_DECIMALS)
+
+logger = logging.getLogger(__name__)
+
+
+class _BufferedHandler(logging.handlers.MemoryHandler):
+    # o flush() padrao repassa registro a registro ao StreamHandler, que faz um
+    # flush no stdout a cada linha; aqui o buffer vira um unico write e um flush
+    def flush(self):
+        with self.lock:
+            if not self.buffer or self.target is None:
+                return
+
+            target = self.target
+            try:
+                text = ''.join(target.format(record) + target.terminator for record in self.buffer)
+                with target.lock:
+                    target.stream.write(text)
+                    target.stream.flush()
+            except Exception:
+                self.handleError(self.buffer[-1])
+
+            self.buffer.clear()
+
+
+def setup_logging(capacity=100):
+    # os registros ficam em memoria e sao gravados de uma vez no flush() de cada
+    # ciclo, ou imediatamente a partir de WARNING
+    formatter = logging.Formatter('%(asctime)s - %(message)s', '%m/%d/%Y %H:%M:%S')
+    formatter.converter = time.gmtime  # horario em UTC, como no cabecalho antigo
+
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(formatter)
+
+    buffer = _BufferedHandler(capacity, flushLevel=logging.WARNING, target=console)
+    logging.basicConfig(level=logging.INFO, handlers=[buffer])
+
+    return buffer
+
+
+def ttl_cache(seconds):
+    # reaproveita a resposta da API por alguns segundos, evitando chamadas repetidas
+    def decorator(func):
+        cache = {}
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            now = time.monotonic()
+            hit = cache.get(args)
+            if hit is not None and now - hit[0] < seconds:
+                return hit[1]
+
+            value = func(*args)
+            cache[args] = (now, value)
+            return value
+
+        wrapper.invalidate = cache.clear
+        return wrapper
+
+    return decorator
+
+
+def rate_limit(api, calls=TAPI_CALLS, period=TAPI_PERIOD):
+    # limita as chamadas da Trade API a n por periodo (janela deslizante),
+    # so espera quando a cota estiver esgotada
+    sent = collections.deque()
+
+    def wait():
+        now = time.monotonic()
+        while sent and now - sent[0] >= period:
+            sent.popleft()
+
+        if len(sent) >= calls:
+            time.sleep(period - (now - sent[0]))
+            sent.popleft()
+
+        sent.append(time.monotonic())
+
+    def limited(method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            wait()
+            return method(*args, **kwargs)
+
+        return wrapper
+
+    for name in ('get_account_info', 'list_orders', 'place_buy_order', 'place_sell_order', 'cancel_order'):
+        setattr(api, name, limited(getattr(api, name)))
+
+    return api
 
-    return df_ticker
 
+class _TimeoutAdapter(HTTPAdapter):
+    # o pacote mercadobitcoin nao passa timeout; sem ele uma conexao do pool que
+    # caiu durante o sleep pode travar a chamada ate o TCP desistir
+    def send(self, request, timeout=None, **kwargs):
+        return super().send(request, timeout=timeout or HTTP_TIMEOUT, **kwargs)
 
+
+def keep_alive(pool_size=2):
+    # o pacote mercadobitcoin chama requests.get/post direto, abrindo uma conexao
+    # TCP+TLS nova a cada requisicao; usa um Session unico para reaproveitar a conexao.
+    # Toda requisicao tem HTTP_TIMEOUT, mas nenhum Retry: repetir um POST assinado
+    # reenviaria um tapi_nonce ja consumido pela exchange
+    session = requests.Session()
+    session.mount('https://', _TimeoutAdapter(pool_connections=1, pool_maxsize=pool_size))
+
+    mercadobitcoin.api.requests = session
+    mercadobitcoin.trade_api.requests = session
+
+    return session
+
+
+@ttl_cache(TICKER_TTL)
+def ticker(mbtc):
+    return {key: float(value) for key, value in mbtc.ticker()['ticker'].items()}
+
+
+@ttl_cache(BALANCE_TTL)
 def get_account_info(mbtc):
-    balance = json.dumps(mbtc.get_account_info())
-    df_balance = pd.read_json(balance)
-    df_balance = df_balance.filter(items=['brl'], axis=0)
-    print(df_balance)
-    df_balance = pd.json_normalize(df_balance['balance'])
+    balance = {key: float(value) for key, value in mbtc.get_account_info()['balance']['brl'].items()}
+    logger.info('balance: %s', balance)
+
+    return balance
+
+def list_open_orders(mbtc, limit=None):
+    # Lista apenas as ordens em aberto (status 2), o filtro é feito pela API
+    orders = mbtc.list_orders(coin_pair="BRLBTC", status_list='[2]')['orders']
+
+    open_orders = []
+    for order in orders:
+        # conversão de unix time para datatime
+        order['created_timestamp'] = _utc(order['created_timestamp'])
+        order['updated_timestamp'] = _utc(order['updated_timestamp'])
+        del order['operations']
+        open_orders.append(order)
+
+    # a API nao garante a ordem; a mais antiga fica sempre na primeira posicao
+    open_orders.sort(key=lambda order: order['created_timestamp'])
+    return open_orders[:limit]
+
+
+def _utc(timestamp):
+    # datetime em UTC sem tzinfo, comparavel com datetime.utcnow()
+    return datetime.fromtimestamp(int(timestamp), timezone.utc).replace(tzinfo=None)
 
-    return df_balance
 
-def list_open_orders(mbtc):
-    # Lista as ordens executadas e filtra apenas as ordens em aberto
-    orders = json.dumps(mbtc.list_orders(coin_pair="BRLBTC"))
-    df_orders = pd.read_json(orders)
-    df_orders = pd.json_normalize(df_orders['orders'])
-    df_orders = df_orders.drop(['operations'], axis=1)
+def place_orders(mbtc, side, orders, coin_pair="BRLBTC"):
+    # envia em sequencia, o tapi_nonce de cada requisicao precisa ser crescente;
+    # o log fica para depois para nao atrasar as ordens seguintes
+    place = mbtc.place_buy_order if side == 'buy' else mbtc.place_sell_order
+    for quantity, limit_price in orders:
+        place(coin_pair=coin_pair, quantity=quantity, limit_price=limit_price)
 
-    # filtra ordens em aberto
-    df_open_orders = df_orders[df_orders.status.eq(2)]
+    for x, (quantity, limit_price) in enumerate(orders):
+        logger.info('order %d => qty: %s price: %s', x, quantity, limit_price)
 
-    # conversão de unix time para datatime
-    df_open_orders['created_timestamp'] = pd.to_datetime(df_open_orders['created_timestamp'], unit='s')
-    df_open_orders['updated_timestamp'] = pd.to_datetime(df_open_orders['updated_timestamp'], unit='s')
-    return df_open_orders.head()
+
+def cancel_orders(mbtc, order_ids, coin_pair="BRLBTC"):
+    # cancela em sequencia, pelo mesmo motivo de place_orders
+    for order_id in order_ids:
+        mbtc.cancel_order(coin_pair=coin_pair, order_id=order_id)
+        logger.info('order_id: %s - CANCELED', order_id)
 
 
 def round_down(n, decimals=0):
-    multiplier = 10 ** decimals
-    return math.floor(n * multiplier) / multiplier
+    return float(_truncate(n, Decimal(1).scaleb(-decimals)))
+
+
+def round_down_price(n):
+    return float(_truncate(n, _PRICE_QUANTUM))
+
+
+def format_price(n):
+    # limit_price em notacao decimal fixa, str(float) daria '1e-05' para valores pequenos
+    return format(_truncate(n, _PRICE_QUANTUM), 'f')
+
+
+def format_quantity(n):
+    # quantity em notacao decimal fixa, str(0.00004741) daria '4.741e-05'
+    return format(_truncate(n, _QUANTITY_QUANTUM), 'f')
+
+
+def _truncate(n, quantum):
+    # trunca sobre a representacao decimal do float: com math.floor(n * 10 ** d)
+    # o erro binario fazia 0.29 virar 0.28
+    return Decimal(repr(n)).quantize(quantum, rounding=ROUND_DOWN)
+
+
+def grid_multipliers(split, spread):
+    # fator de preco de cada uma das n ordens do grid, cada uma spread% mais distante do preco base
+    # spread negativo monta o grid abaixo do preco (compra), positivo acima (venda)
+    step = spread / 100
+    return [1 + (x + 1) * step for x in range(split)]
+
+
+def grid_prices(price, multipliers):
+    return [round_down_price(price * multiplier) for multiplier in multipliers]
@@ -0,0 +1,72 @@
+import json
+import logging
+import threading
+import time
+
+WS_URL = 'wss://ws.mercadobitcoin.net/ws'
+MAX_AGE = 5  # seconds without a ticker message before falling back to REST
+RECONNECT_DELAY = 5  # first wait after the socket drops, doubled on each retry ...
+MAX_RECONNECT_DELAY = 60  # ... up to n seconds
+
+latest_ticker = {}
+_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+def _run(pair, connect):
+    subscribe = json.dumps({'type': 'subscribe', 'subscription': {'name': 'ticker', 'id': pair}})
+
+    delay = RECONNECT_DELAY
+    failures = 0
+
+    while True:
+        error = 'conexao encerrada pelo servidor'
+        try:
+            with connect(WS_URL) as ws:
+                ws.send(subscribe)
+
+                for message in ws:
+                    msg = json.loads(message)
+                    if msg.get('type') != 'ticker':
+                        continue
+
+                    data = {key: float(value) for key, value in msg['data'].items()}
+                    with _lock:
+                        latest_ticker.update(data)
+                        latest_ticker['ts'] = time.time()
+
+                    # feed voltou a funcionar, a proxima queda comeca do atraso minimo
+                    delay = RECONNECT_DELAY
+                    failures = 0
+        except Exception as e:
+            error = e
+
+        # espera apos qualquer queda, inclusive fechamento normal, dobrando o atraso;
+        # so a primeira falha seguida vai para WARNING
+        failures += 1
+        level = logging.WARNING if failures == 1 else logging.DEBUG
+        logger.log(level, 'websocket: %s - reconectando em %s segundos', error, delay)
+        time.sleep(delay)
+        delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+
+def start(pair='BRL-BTC'):
+    # mantem o ticker atualizado em uma thread separada
+    try:
+        from websockets.sync.client import connect
+    except ImportError:
+        logger.warning('websocket: pacote websockets nao instalado - usando a API REST')
+        return None
+
+    thread = threading.Thread(target=_run, args=(pair, connect), daemon=True)
+    thread.start()
+    return thread
+
+
+def get_ticker():
+    # retorna o ultimo ticker recebido, ou None se o socket estiver parado
+    with _lock:
+        if latest_ticker and time.time() - latest_ticker['ts'] < MAX_AGE:
+            return dict(latest_ticker)
+    return None